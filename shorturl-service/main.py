@@ -1,19 +1,39 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, RedirectResponse
+from fastapi.responses import Response, RedirectResponse, ORJSONResponse
 from pydantic import BaseModel, HttpUrl
 from typing import Optional
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
+from functools import lru_cache
+from collections import OrderedDict, Counter
+import asyncio
+import logging
+import threading
 import sqlite3
+import aiosqlite
 import os
 import string
-import random
+import secrets
 import qrcode
 from io import BytesIO
 
 # Путь к базе данных
 DB_PATH = "/app/data/shorturl.db" if os.path.exists("/app/data") else "shorturl.db"
 
+# Статистика при запуске требует полного прохода по таблице, поэтому включается отдельно
+STARTUP_STATS = os.environ.get("STARTUP_STATS") == "1"
+
+# Логи запросов пишутся на уровне DEBUG и по умолчанию отключены (LOG_LEVEL=WARNING),
+# чтобы не форматировать строки и не захватывать stdout на каждом запросе.
+# Уровень задаётся только логгеру сервиса: корневой логгер не трогаем,
+# иначе LOG_LEVEL=DEBUG включит и отладочные логи библиотек (aiosqlite)
+logger = logging.getLogger(__name__)
+logger.setLevel(os.environ.get("LOG_LEVEL", "WARNING").upper())
+log_handler = logging.StreamHandler()
+log_handler.setFormatter(logging.Formatter("%(name)s: %(message)s"))
+logger.addHandler(log_handler)
+logger.propagate = False
+
 # Модель для создания короткой ссылки
 class URLCreate(BaseModel):
     url: HttpUrl
@@ -23,17 +43,150 @@ class QRCodeRequest(BaseModel):
     url: str
     color: str = "#000000"
 
+# SQL-запросы горячих путей. Строки-константы переиспользуются в кэше
+# подготовленных выражений SQLite и не собираются заново при каждом вызове
+SQL_NEXT_URL_NUMBER = "UPDATE counters SET value = value + 1 WHERE name = 'urls' RETURNING value"
+# Вставка без предварительной проверки: для нового URL это единственный запрос,
+# для существующего RETURNING пуст и short_id читается SQL_SELECT_SHORT_ID.
+# Именно ON CONFLICT(full_url), а не INSERT OR IGNORE: OR IGNORE молча проглотил бы
+# и конфликт по short_id, который shorten_url обрабатывает повтором
+SQL_INSERT_URL = (
+    "INSERT INTO urls (short_id, full_url) VALUES (?, ?) "
+    "ON CONFLICT(full_url) DO NOTHING RETURNING short_id"
+)
+SQL_SELECT_SHORT_ID = "SELECT short_id FROM urls WHERE full_url = ?"
+SQL_SELECT_FULL_URL = "SELECT full_url FROM urls WHERE short_id = ?"
+URL_COLUMNS = ("id", "short_id", "full_url", "created_at", "clicks")
+SQL_SELECT_ALL_URLS = f"SELECT {', '.join(URL_COLUMNS)} FROM urls ORDER BY created_at DESC"
+SQL_SELECT_URL = "SELECT * FROM urls WHERE short_id = ?"
+SQL_DELETE_URL = "DELETE FROM urls WHERE short_id = ? RETURNING id"
+SQL_ADD_CLICKS = "UPDATE urls SET clicks = clicks + ? WHERE short_id = ?"
+
+# Количество соединений для чтения в пуле
+POOL_SIZE = min(8, (os.cpu_count() or 1) * 2)
+
+# Размер страницы БД (по умолчанию SQLite использует 4096)
+PAGE_SIZE = 8192
+
 # Функция для подключения к базе данных
-def get_db():
-    conn = sqlite3.connect(DB_PATH)
+async def get_db(query_only=False):
+    conn = await aiosqlite.connect(DB_PATH, isolation_level=None)
     conn.row_factory = sqlite3.Row
+    await conn.execute("PRAGMA journal_mode=WAL")
+    await conn.execute("PRAGMA synchronous=NORMAL")
+    # Ждём блокировку до 5 секунд, если в БД пишет другой процесс (например, другой воркер)
+    await conn.execute("PRAGMA busy_timeout=5000")
+    await conn.execute("PRAGMA temp_store=MEMORY")
+    # 64 МБ кэша страниц и mmap до 256 МБ: небольшая БД целиком читается из памяти
+    await conn.execute("PRAGMA cache_size=-65536")
+    await conn.execute("PRAGMA mmap_size=268435456")
+    if query_only:
+        await conn.execute("PRAGMA query_only=ON")
     return conn
 
+# Перевод файла БД на PAGE_SIZE (выполняется один раз, до открытия пула).
+# В режиме WAL размер страницы не меняется, поэтому на время VACUUM выходим из WAL.
+# Выйти из WAL нельзя, пока БД открыта другим процессом (другой воркер, перезапуск),
+# поэтому перевод необязательный: при блокировке работаем с текущим размером страницы
+async def set_page_size():
+    async with aiosqlite.connect(DB_PATH, isolation_level=None) as conn:
+        await conn.execute("PRAGMA busy_timeout=5000")
+        rows = await conn.execute_fetchall("PRAGMA page_size")
+        if rows[0][0] != PAGE_SIZE:
+            try:
+                await conn.execute("PRAGMA journal_mode=DELETE")
+                await conn.execute(f"PRAGMA page_size={PAGE_SIZE}")
+                await conn.execute("VACUUM")
+            except sqlite3.OperationalError as e:
+                logger.warning("⚠️ Размер страницы БД не изменён (%s), продолжаем с текущим", e)
+            finally:
+                # Соединения пула всё равно включают WAL в get_db
+                with suppress(sqlite3.OperationalError):
+                    await conn.execute("PRAGMA journal_mode=WAL")
+
+# Выполнение запроса с получением одной строки (None, если строк нет).
+# execute_fetchall делает execute и fetch за один переход в поток соединения
+async def fetch_one(conn, sql, parameters=()):
+    rows = await conn.execute_fetchall(sql, parameters)
+    return rows[0] if rows else None
+
+# Пул соединений: один писатель и несколько читателей (WAL допускает параллельное чтение)
+class ConnectionPool:
+    def __init__(self, size=POOL_SIZE):
+        self.size = size
+        self.writer = None
+        # Все эндпоинты работают в event loop, поэтому запись сериализуем asyncio.Lock
+        self.write_lock = asyncio.Lock()
+        self.readers = asyncio.Queue(maxsize=size)
+
+    async def open(self):
+        self.writer = await get_db()
+        for _ in range(self.size):
+            self.readers.put_nowait(await get_db(query_only=True))
+
+    # row_factory=None отдаёт строки кортежами: быстрее sqlite3.Row, когда имена колонок не нужны
+    @asynccontextmanager
+    async def acquire_read(self, row_factory=sqlite3.Row):
+        conn = await self.readers.get()
+        conn.row_factory = row_factory
+        try:
+            yield conn
+        finally:
+            self.readers.put_nowait(conn)
+
+    @asynccontextmanager
+    async def acquire_write(self):
+        async with self.write_lock:
+            yield self.writer
+
+    # Транзакция из нескольких запросов. BEGIN IMMEDIATE сразу берёт блокировку на запись,
+    # поэтому внутри транзакции SQLite не вернёт SQLITE_BUSY при переходе от чтения к записи.
+    # BEGIN выполняется внутри try: при отмене задачи во время await aiosqlite всё равно
+    # выполнит его в своём потоке, и транзакцию нужно откатить
+    @asynccontextmanager
+    async def transaction(self):
+        async with self.acquire_write() as conn:
+            try:
+                await conn.execute("BEGIN IMMEDIATE")
+                yield conn
+            except BaseException:
+                # Транзакции может не быть (BEGIN не выполнился) — исходную ошибку не подменяем
+                with suppress(sqlite3.OperationalError):
+                    await conn.execute("ROLLBACK")
+                raise
+            await conn.execute("COMMIT")
+
+    def health(self):
+        return {
+            "readers_total": self.size,
+            "readers_available": self.readers.qsize(),
+            "writer_busy": self.write_lock.locked()
+        }
+
+    async def close(self):
+        while not self.readers.empty():
+            await self.readers.get_nowait().close()
+        await self.writer.close()
+
+# Старые версии сервиса проверяли URL и вставляли его без блокировки, поэтому в БД
+# могут быть дубли full_url. Перед созданием уникального индекса оставляем по одной
+# строке (с наименьшим id) и переносим в неё клики удаляемых дублей
+async def merge_duplicate_urls(conn):
+    await conn.execute("""
+        UPDATE urls SET clicks = (
+            SELECT SUM(COALESCE(d.clicks, 0)) FROM urls d WHERE d.full_url = urls.full_url
+        )
+        WHERE id IN (SELECT MIN(id) FROM urls GROUP BY full_url HAVING COUNT(*) > 1)
+    """)
+    cursor = await conn.execute(
+        "DELETE FROM urls WHERE id NOT IN (SELECT MIN(id) FROM urls GROUP BY full_url)"
+    )
+    if cursor.rowcount:
+        logger.warning("⚠️ Удалено дублей full_url: %s (клики перенесены в оставшиеся ссылки)", cursor.rowcount)
+
 # Функция для инициализации базы данных
-def init_db():
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("""
+async def init_db(conn):
+    await conn.execute("""
         CREATE TABLE IF NOT EXISTS urls (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             short_id TEXT UNIQUE NOT NULL,
@@ -42,37 +195,214 @@ def init_db():
             clicks INTEGER DEFAULT 0
         )
     """)
-    conn.commit()
-    conn.close()
+    # Уникальный индекс для дедупликации по full_url (INSERT ... ON CONFLICT(full_url)).
+    # Для short_id отдельный индекс не нужен: его создаёт ограничение UNIQUE
+    index = await fetch_one(
+        conn, "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_urls_full_url'"
+    )
+    if not index:
+        await merge_duplicate_urls(conn)
+        await conn.execute("CREATE UNIQUE INDEX idx_urls_full_url ON urls(full_url)")
+    # Монотонный счётчик, из которого выводится short_id
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    """)
+    await conn.execute(
+        "INSERT OR IGNORE INTO counters (name, value) "
+        "SELECT 'urls', COALESCE(MAX(id), 0) FROM urls"
+    )
+    # Настройки экземпляра сервиса (секретный ключ для short_id)
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS settings (
+            name TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+    """)
+
+# Загрузка ключей раундов для short_id. Ключ генерируется один раз через secrets
+# и хранится в БД, чтобы перестановка не менялась между перезапусками
+async def load_short_id_keys(conn):
+    await conn.execute(
+        "INSERT OR IGNORE INTO settings (name, value) VALUES ('short_id_key', ?)",
+        (secrets.token_hex(8),)
+    )
+    row = await fetch_one(conn, "SELECT value FROM settings WHERE name = 'short_id_key'")
+    key = bytes.fromhex(row["value"])
+    return tuple(int.from_bytes(key[i:i + 2], "big") for i in range(0, len(key), 2))
+
+# Алфавит base62 для short_id
+SHORT_ID_ALPHABET = string.ascii_letters + string.digits
+
+# Биективная перестановка 32-битного числа сетью Фейстеля (разные номера дают
+# разные результаты). Секретные ключи раундов не дают восстановить порядок short_id
+def feistel_permute(n, keys):
+    left, right = n >> 16, n & 0xFFFF
+    for key in keys:
+        left, right = right, left ^ (((right * 0x9E37) ^ key ^ (right >> 5)) & 0xFFFF)
+    return (left << 16) | right
+
+# Генерация short_id из номера счётчика: base62 от перестановки номера.
+# 62^6 > 2^32, поэтому 6 символов хватает на все 32-битные номера без коллизий
+def generate_short_id(n, keys, length=6):
+    n = feistel_permute(n, keys)
+    chars = []
+    for _ in range(length):
+        n, rem = divmod(n, 62)
+        chars.append(SHORT_ID_ALPHABET[rem])
+    return ''.join(chars)
+
+# Размер LRU-кэша short_id -> full_url для редиректов
+URL_CACHE_SIZE = 4096
+
+# Интервал записи накопленных кликов в БД (секунды)
+CLICK_FLUSH_INTERVAL = 0.2
+
+# LRU-кэш для редиректов: небольшое число ссылок получает большую часть переходов.
+# Кэш и счётчик кликов меняются только из event loop, поэтому блокировки не нужны
+URL_CACHE = OrderedDict()
+
+# Номер поколения кэша: растёт при каждой инвалидации. Промах кэша запоминает его
+# до чтения из БД и не кладёт результат, если за время чтения ссылку удалили
+# (снимок WAL у читателя может быть старше удаления, поэтому перечитывание не помогает)
+URL_CACHE_EPOCH = 0
+
+def cache_epoch():
+    return URL_CACHE_EPOCH
+
+def cache_get(short_id):
+    full_url = URL_CACHE.get(short_id)
+    if full_url is not None:
+        URL_CACHE.move_to_end(short_id)
+    return full_url
+
+def cache_put(short_id, full_url, epoch=None):
+    if epoch is not None and epoch != URL_CACHE_EPOCH:
+        return
+    URL_CACHE[short_id] = full_url
+    URL_CACHE.move_to_end(short_id)
+    if len(URL_CACHE) > URL_CACHE_SIZE:
+        URL_CACHE.popitem(last=False)
+
+def cache_invalidate(short_id):
+    global URL_CACHE_EPOCH
+    URL_CACHE_EPOCH += 1
+    URL_CACHE.pop(short_id, None)
+
+# Накопленные, но ещё не записанные клики: short_id -> количество
+PENDING_CLICKS = Counter()
+
+def add_click(short_id):
+    PENDING_CLICKS[short_id] += 1
+
+def take_pending_clicks():
+    pending = PENDING_CLICKS.copy()
+    PENDING_CLICKS.clear()
+    return pending
+
+# Поиск полного URL в БД (при промахе кэша)
+async def find_full_url(pool, short_id):
+    async with pool.acquire_read(row_factory=None) as conn:
+        result = await fetch_one(conn, SQL_SELECT_FULL_URL, (short_id,))
+    if result is None:
+        return None
+    full_url, = result
+    return full_url
+
+# Запись накопленных кликов одной транзакцией
+async def write_clicks(pool, items):
+    async with pool.transaction() as conn:
+        await conn.executemany(SQL_ADD_CLICKS, items)
+
+# Сбрасываем в БД все накопившиеся клики
+async def flush_clicks(state):
+    clicks = take_pending_clicks()
+    if clicks:
+        items = [(count, short_id) for short_id, count in clicks.items()]
+        try:
+            await write_clicks(state.pool, items)
+        except BaseException:
+            # Возвращаем клики, чтобы записать их при следующей попытке
+            # (в том числе при отмене задачи посреди записи)
+            PENDING_CLICKS.update(clicks)
+            raise
+        # Общее число переходов ведём по записанным кликам вместо SUM(clicks)
+        if state.total_clicks is not None:
+            state.total_clicks += sum(clicks.values())
 
-# Генерация случайного short_id
-def generate_short_id(length=6):
-    characters = string.ascii_letters + string.digits
-    return ''.join(random.choice(characters) for _ in range(length))
+# Фоновая задача: периодически записывает клики в БД.
+# Останавливается событием stop, а не cancel(), чтобы не прервать запись на середине
+async def click_flusher(state, stop):
+    while not stop.is_set():
+        with suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(stop.wait(), CLICK_FLUSH_INTERVAL)
+        try:
+            await flush_clicks(state)
+        except Exception as e:
+            logger.warning("⚠️ Не удалось записать клики: %s", e)
+
+# Суффикс со счётчиком для лога (пустой, если статистика не ведётся)
+def format_count(label, value):
+    return f" | {label}: {value}" if value is not None else ""
 
 # Lifespan event handler
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    init_db()
+    await set_page_size()
+    app.state.pool = ConnectionPool()
+    await app.state.pool.open()
+    # Инициализация и миграция в одной транзакции: воркеры, запущенные вместе,
+    # не выполнят её параллельно
+    async with app.state.pool.transaction() as conn:
+        await init_db(conn)
+        app.state.short_id_keys = await load_short_id_keys(conn)
     print(f"Database initialized at {DB_PATH}")
     
+    # Счётчики для логов: заполняются только при STARTUP_STATS=1
+    app.state.url_count = None
+    app.state.total_clicks = None
+    
     # Выводим статистику при запуске
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) as count FROM urls")
-    count = cursor.fetchone()["count"]
-    cursor.execute("SELECT SUM(clicks) as total_clicks FROM urls")
-    total_clicks = cursor.fetchone()["total_clicks"] or 0
-    conn.close()
-    
-    print(f"📊 Всего ссылок в базе: {count}")
-    print(f"👆 Всего переходов: {total_clicks}")
-    print("=" * 50)
+    if STARTUP_STATS:
+        async with app.state.pool.acquire_read() as conn:
+            row = await fetch_one(conn, "SELECT COUNT(*) as count FROM urls")
+            app.state.url_count = row["count"]
+            row = await fetch_one(conn, "SELECT SUM(clicks) as total_clicks FROM urls")
+            app.state.total_clicks = row["total_clicks"] or 0
+        
+        print(f"📊 Всего ссылок в базе: {app.state.url_count}")
+        print(f"👆 Всего переходов: {app.state.total_clicks}")
+        print("=" * 50)
+    
+    stop_flusher = asyncio.Event()
+    flusher = asyncio.create_task(click_flusher(app.state, stop_flusher))
     
     yield
+    
+    # Останавливаем фоновую задачу: она завершает текущую запись
+    # и последним проходом записывает оставшиеся клики
+    stop_flusher.set()
+    await flusher
+    try:
+        await flush_clicks(app.state)
+    except Exception as e:
+        logger.warning("⚠️ Не удалось записать клики: %s", e)
+    finally:
+        await app.state.pool.close()
+    
+    if STARTUP_STATS:
+        print(f"📊 Всего ссылок в базе: {app.state.url_count}")
+        print(f"👆 Всего переходов: {app.state.total_clicks}")
 
-# Создаём приложение FastAPI
-app = FastAPI(title="URL Shortener Service", version="1.0.0", lifespan=lifespan)
+# Создаём приложение FastAPI (JSON-ответы сериализуются через orjson)
+app = FastAPI(
+    title="URL Shortener Service",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
+)
 
 # Добавляем CORS
 app.add_middleware(
@@ -84,87 +414,80 @@ app.add_middleware(
 )
 
 # POST /shorten - Создать короткую ссылку
-@app.post("/shorten")
-def shorten_url(url_data: URLCreate):
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    # Проверяем существует ли уже такой URL
-    cursor.execute("SELECT short_id FROM urls WHERE full_url = ?", (str(url_data.url),))
-    existing = cursor.fetchone()
-    
-    if existing:
-        conn.close()
-        print(f"♻️ URL уже существует: {existing['short_id']}")
-        return {
-            "short_id": existing["short_id"],
-            "short_url": f"http://localhost:8001/{existing['short_id']}",
-            "full_url": str(url_data.url),
-            "message": "URL already exists"
-        }
-    
-    # Генерируем уникальный short_id
-    while True:
-        short_id = generate_short_id()
-        cursor.execute("SELECT id FROM urls WHERE short_id = ?", (short_id,))
-        if not cursor.fetchone():
+@app.post("/shorten", response_model=None)
+async def shorten_url(url_data: URLCreate):
+    # Счётчик и вставка выполняются в одной транзакции
+    async with app.state.pool.transaction() as conn:
+        # Сохраняем в базу, если такого URL ещё нет.
+        # Новые short_id не пересекаются между собой; повтор нужен только при
+        # совпадении со случайным short_id, созданным старыми версиями сервиса
+        while True:
+            number = (await fetch_one(conn, SQL_NEXT_URL_NUMBER))["value"]
+            short_id = generate_short_id(number, app.state.short_id_keys)
+            try:
+                created = await fetch_one(conn, SQL_INSERT_URL, (short_id, str(url_data.url)))
+            except sqlite3.IntegrityError:
+                continue
             break
+        
+        if not created:
+            existing = await fetch_one(conn, SQL_SELECT_SHORT_ID, (str(url_data.url),))
+            logger.debug("♻️ URL уже существует: %s", existing["short_id"])
+            return ORJSONResponse({
+                "short_id": existing["short_id"],
+                "short_url": f"http://localhost:8001/{existing['short_id']}",
+                "full_url": str(url_data.url),
+                "message": "URL already exists"
+            })
+        
+        # Счётчик ссылок ведём в памяти вместо SELECT COUNT(*) на каждую запись
+        if app.state.url_count is not None:
+            app.state.url_count += 1
+        count = app.state.url_count
     
-    # Сохраняем в базу
-    cursor.execute(
-        "INSERT INTO urls (short_id, full_url) VALUES (?, ?)",
-        (short_id, str(url_data.url))
-    )
-    conn.commit()
-    
-    # Получаем новый счётчик ссылок
-    cursor.execute("SELECT COUNT(*) as count FROM urls")
-    count = cursor.fetchone()["count"]
-    conn.close()
+    # Сразу кладём новую ссылку в кэш: первый же переход не пойдёт в БД
+    cache_put(short_id, str(url_data.url))
     
-    print(f"✅ Создана новая ссылка: {short_id} | Всего ссылок: {count}")
+    logger.debug("✅ Создана новая ссылка: %s%s", short_id, format_count("Всего ссылок", count))
     
-    return {
+    return ORJSONResponse({
         "short_id": short_id,
         "short_url": f"http://localhost:8001/{short_id}",
         "full_url": str(url_data.url)
-    }
+    })
 
 # GET /all - Получить все ссылки
-@app.get("/all")
-def get_all_urls():
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM urls ORDER BY created_at DESC")
-    urls = cursor.fetchall()
-    conn.close()
+@app.get("/all", response_model=None)
+async def get_all_urls():
+    # Строки читаем кортежами и собираем словари через zip (без поколоночного доступа sqlite3.Row)
+    async with app.state.pool.acquire_read(row_factory=None) as conn:
+        urls = await conn.execute_fetchall(SQL_SELECT_ALL_URLS)
     
-    return [dict(url) for url in urls]
+    # Возвращаем ORJSONResponse напрямую, минуя jsonable_encoder
+    return ORJSONResponse([dict(zip(URL_COLUMNS, url)) for url in urls])
 
 # GET /stats/{short_id} - Получить статистику
-@app.get("/stats/{short_id}")
-def get_stats(short_id: str):
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT * FROM urls WHERE short_id = ?", (short_id,))
-    result = cursor.fetchone()
-    conn.close()
+@app.get("/stats/{short_id}", response_model=None)
+async def get_stats(short_id: str):
+    async with app.state.pool.acquire_read() as conn:
+        result = await fetch_one(conn, SQL_SELECT_URL, (short_id,))
     
     if not result:
         raise HTTPException(status_code=404, detail="Short URL not found")
     
-    return {
+    return ORJSONResponse({
         "short_id": result["short_id"],
         "full_url": result["full_url"],
         "created_at": result["created_at"],
         "clicks": result["clicks"]
-    }
+    })
 
-# POST /qrcode - Генерация QR-кода
-@app.post("/qrcode")
-def generate_qr_code(qr_data: QRCodeRequest):
-    try:
+# Объекты QRCode переиспользуются в каждом потоке пула (сам объект не потокобезопасен)
+qr_local = threading.local()
+
+def get_qr():
+    qr = getattr(qr_local, "qr", None)
+    if qr is None:
         # Создаём QR-код
         qr = qrcode.QRCode(
             version=1,
@@ -172,76 +495,92 @@ def generate_qr_code(qr_data: QRCodeRequest):
             box_size=10,
             border=4,
         )
-        qr.add_data(qr_data.url)
-        qr.make(fit=True)
-        
-        # Создаём изображение с выбранным цветом
-        img = qr.make_image(fill_color=qr_data.color, back_color="white")
-        
-        # Сохраняем в BytesIO
-        buf = BytesIO()
-        img.save(buf, format='PNG')
-        buf.seek(0)
+        qr_local.qr = qr
+    else:
+        # make(fit=True) увеличивает версию под длинные данные, поэтому сбрасываем её
+        qr.clear()
+        qr.version = 1
+    return qr
+
+# Рендер QR-кода в PNG. Результат детерминирован, поэтому кэшируем по (url, color)
+@lru_cache(maxsize=1024)
+def render_qr_png(url, color):
+    qr = get_qr()
+    qr.add_data(url)
+    qr.make(fit=True)
+    
+    # Создаём изображение с выбранным цветом
+    img = qr.make_image(fill_color=color, back_color="white")
+    
+    # Сохраняем в BytesIO. Сжатие по умолчанию (9) занимает большую часть времени рендера,
+    # а для двухцветной картинки уровень 1 почти не увеличивает размер файла
+    buf = BytesIO()
+    img.save(buf, format='PNG', optimize=False, compress_level=1)
+    return buf.getvalue()
+
+# POST /qrcode - Генерация QR-кода
+@app.post("/qrcode")
+async def generate_qr_code(qr_data: QRCodeRequest):
+    try:
+        # Рендер занимает CPU, поэтому выполняем его в пуле потоков, не блокируя event loop
+        loop = asyncio.get_running_loop()
+        png = await loop.run_in_executor(None, render_qr_png, qr_data.url, qr_data.color)
         
-        print(f"🎨 Сгенерирован QR-код цвета: {qr_data.color}")
+        logger.debug("🎨 Сгенерирован QR-код цвета: %s", qr_data.color)
         
-        return StreamingResponse(buf, media_type="image/png")
+        return Response(content=png, media_type="image/png")
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# GET /pool-health - Состояние пула соединений
+@app.get("/pool-health")
+async def pool_health():
+    return app.state.pool.health()
+
 # DELETE /delete/{short_id} - Удалить ссылку
 @app.delete("/delete/{short_id}")
-def delete_url(short_id: str):
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT * FROM urls WHERE short_id = ?", (short_id,))
-    url = cursor.fetchone()
-    
-    if not url:
-        conn.close()
-        raise HTTPException(status_code=404, detail="Short URL not found")
-    
-    cursor.execute("DELETE FROM urls WHERE short_id = ?", (short_id,))
-    conn.commit()
-    
-    # Получаем новый счётчик ссылок
-    cursor.execute("SELECT COUNT(*) as count FROM urls")
-    count = cursor.fetchone()["count"]
-    conn.close()
+async def delete_url(short_id: str):
+    async with app.state.pool.acquire_write() as conn:
+        deleted = await fetch_one(conn, SQL_DELETE_URL, (short_id,))
+        
+        if not deleted:
+            raise HTTPException(status_code=404, detail="Short URL not found")
+        
+        cache_invalidate(short_id)
+        
+        if app.state.url_count is not None:
+            app.state.url_count -= 1
+        count = app.state.url_count
     
-    print(f"🗑️ Удалена ссылка: {short_id} | Осталось ссылок: {count}")
+    logger.debug("🗑️ Удалена ссылка: %s%s", short_id, format_count("Осталось ссылок", count))
     
     return {"message": "URL deleted successfully"}
 
 # GET /{short_id} - Редирект на полный URL
-@app.get("/{short_id}")
-def redirect_to_url(short_id: str):
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT full_url FROM urls WHERE short_id = ?", (short_id,))
-    result = cursor.fetchone()
+@app.get("/{short_id}", response_model=None)
+async def redirect_to_url(short_id: str):
+    full_url = cache_get(short_id)
     
-    if not result:
-        conn.close()
-        raise HTTPException(status_code=404, detail="Short URL not found")
-    
-    # Увеличиваем счётчик кликов
-    cursor.execute("UPDATE urls SET clicks = clicks + 1 WHERE short_id = ?", (short_id,))
-    conn.commit()
+    if full_url is None:
+        epoch = cache_epoch()
+        full_url = await find_full_url(app.state.pool, short_id)
+        
+        if full_url is None:
+            raise HTTPException(status_code=404, detail="Short URL not found")
+        
+        # Не кэшируем, если ссылку удалили, пока шло чтение
+        cache_put(short_id, full_url, epoch)
     
-    # Получаем обновлённое количество кликов
-    cursor.execute("SELECT clicks FROM urls WHERE short_id = ?", (short_id,))
-    clicks = cursor.fetchone()["clicks"]
-    conn.close()
+    # Клик записывается в БД фоновой задачей (счётчик обновляется с небольшой задержкой)
+    add_click(short_id)
     
-    print(f"🔗 Переход по ссылке: {short_id} | Всего переходов: {clicks}")
+    logger.debug("🔗 Переход по ссылке: %s", short_id)
     
-    return RedirectResponse(url=result["full_url"])
+    # Ответ отдаётся без обращения к БД на запись; при попадании в кэш — без БД вообще
+    return RedirectResponse(url=full_url, status_code=307)
 
 # Корневой эндпоинт
 @app.get("/")
-def root():
+async def root():
     return {"message": "URL Shortener Service is running!"}
\ No newline at end of file
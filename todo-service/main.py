@@ -1,9 +1,12 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 from typing import Optional
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
+import asyncio
 import sqlite3
+import aiosqlite
 import os
 
 # Путь к базе данных
@@ -21,17 +24,120 @@ class TaskUpdate(BaseModel):
     description: Optional[str] = None
     completed: Optional[bool] = None
 
+# SQL-запросы. Строки-константы переиспользуются в кэше подготовленных
+# выражений SQLite и не собираются заново при каждом вызове
+SQL_INSERT_TASK = "INSERT INTO tasks (title, description, completed) VALUES (?, ?, ?) RETURNING id"
+TASK_COLUMNS = ("id", "title", "description", "completed")
+SQL_SELECT_ALL_TASKS = f"SELECT {', '.join(TASK_COLUMNS)} FROM tasks"
+SQL_SELECT_TASK = "SELECT * FROM tasks WHERE id = ?"
+SQL_DELETE_TASK = "DELETE FROM tasks WHERE id = ? RETURNING id"
+
+# UPDATE для каждого набора переданных полей (бит i маски — поле TASK_UPDATE_FIELDS[i]).
+# Маска 0 — обновлять нечего, просто возвращаем задачу
+TASK_UPDATE_FIELDS = ("title", "description", "completed")
+
+def build_update_sql(mask):
+    if not mask:
+        return SQL_SELECT_TASK
+    assignments = ", ".join(
+        f"{field} = ?" for i, field in enumerate(TASK_UPDATE_FIELDS) if mask & (1 << i)
+    )
+    return f"UPDATE tasks SET {assignments} WHERE id = ? RETURNING id, title, description, completed"
+
+SQL_UPDATE_TASK = {mask: build_update_sql(mask) for mask in range(1 << len(TASK_UPDATE_FIELDS))}
+
+# Количество соединений для чтения в пуле
+POOL_SIZE = min(8, (os.cpu_count() or 1) * 2)
+
+# Размер страницы БД (по умолчанию SQLite использует 4096)
+PAGE_SIZE = 8192
+
 # Функция для подключения к базе данных
-def get_db():
-    conn = sqlite3.connect(DB_PATH)
+async def get_db(query_only=False):
+    conn = await aiosqlite.connect(DB_PATH, isolation_level=None)
     conn.row_factory = sqlite3.Row
+    await conn.execute("PRAGMA journal_mode=WAL")
+    await conn.execute("PRAGMA synchronous=NORMAL")
+    # Ждём блокировку до 5 секунд, если в БД пишет другой процесс (например, другой воркер)
+    await conn.execute("PRAGMA busy_timeout=5000")
+    await conn.execute("PRAGMA temp_store=MEMORY")
+    # 64 МБ кэша страниц и mmap до 256 МБ: небольшая БД целиком читается из памяти
+    await conn.execute("PRAGMA cache_size=-65536")
+    await conn.execute("PRAGMA mmap_size=268435456")
+    if query_only:
+        await conn.execute("PRAGMA query_only=ON")
     return conn
 
+# Перевод файла БД на PAGE_SIZE (выполняется один раз, до открытия пула).
+# В режиме WAL размер страницы не меняется, поэтому на время VACUUM выходим из WAL.
+# Выйти из WAL нельзя, пока БД открыта другим процессом (другой воркер, перезапуск),
+# поэтому перевод необязательный: при блокировке работаем с текущим размером страницы
+async def set_page_size():
+    async with aiosqlite.connect(DB_PATH, isolation_level=None) as conn:
+        await conn.execute("PRAGMA busy_timeout=5000")
+        rows = await conn.execute_fetchall("PRAGMA page_size")
+        if rows[0][0] != PAGE_SIZE:
+            try:
+                await conn.execute("PRAGMA journal_mode=DELETE")
+                await conn.execute(f"PRAGMA page_size={PAGE_SIZE}")
+                await conn.execute("VACUUM")
+            except sqlite3.OperationalError as e:
+                print(f"⚠️ Размер страницы БД не изменён ({e}), продолжаем с текущим")
+            finally:
+                # Соединения пула всё равно включают WAL в get_db
+                with suppress(sqlite3.OperationalError):
+                    await conn.execute("PRAGMA journal_mode=WAL")
+
+# Выполнение запроса с получением одной строки (None, если строк нет).
+# execute_fetchall делает execute и fetch за один переход в поток соединения
+async def fetch_one(conn, sql, parameters=()):
+    rows = await conn.execute_fetchall(sql, parameters)
+    return rows[0] if rows else None
+
+# Пул соединений: один писатель и несколько читателей (WAL допускает параллельное чтение)
+class ConnectionPool:
+    def __init__(self, size=POOL_SIZE):
+        self.size = size
+        self.writer = None
+        # Все эндпоинты работают в event loop, поэтому запись сериализуем asyncio.Lock
+        self.write_lock = asyncio.Lock()
+        self.readers = asyncio.Queue(maxsize=size)
+
+    async def open(self):
+        self.writer = await get_db()
+        for _ in range(self.size):
+            self.readers.put_nowait(await get_db(query_only=True))
+
+    # row_factory=None отдаёт строки кортежами: быстрее sqlite3.Row, когда имена колонок не нужны
+    @asynccontextmanager
+    async def acquire_read(self, row_factory=sqlite3.Row):
+        conn = await self.readers.get()
+        conn.row_factory = row_factory
+        try:
+            yield conn
+        finally:
+            self.readers.put_nowait(conn)
+
+    @asynccontextmanager
+    async def acquire_write(self):
+        async with self.write_lock:
+            yield self.writer
+
+    def health(self):
+        return {
+            "readers_total": self.size,
+            "readers_available": self.readers.qsize(),
+            "writer_busy": self.write_lock.locked()
+        }
+
+    async def close(self):
+        while not self.readers.empty():
+            await self.readers.get_nowait().close()
+        await self.writer.close()
+
 # Функция для инициализации базы данных
-def init_db():
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("""
+async def init_db(conn):
+    await conn.execute("""
         CREATE TABLE IF NOT EXISTS tasks (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             title TEXT NOT NULL,
@@ -39,20 +145,28 @@ def init_db():
             completed BOOLEAN NOT NULL DEFAULT 0
         )
     """)
-    conn.commit()
-    conn.close()
 
 # Lifespan event handler
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Выполняется при запуске
-    init_db()
+    await set_page_size()
+    app.state.pool = ConnectionPool()
+    await app.state.pool.open()
+    async with app.state.pool.acquire_write() as conn:
+        await init_db(conn)
     print(f"Database initialized at {DB_PATH}")
     yield
-    # Выполняется при остановке (опционально)
+    # Выполняется при остановке
+    await app.state.pool.close()
 
-# Создаём приложение FastAPI
-app = FastAPI(title="ToDo Service", version="1.0.0", lifespan=lifespan)
+# Создаём приложение FastAPI (JSON-ответы сериализуются через orjson)
+app = FastAPI(
+    title="ToDo Service",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
+)
 
 # Добавляем CORS для работы с фронтендом
 app.add_middleware(
@@ -64,110 +178,82 @@ app.add_middleware(
 )
 
 # POST /items - Создать новую задачу
-@app.post("/items", status_code=201)
-def create_task(task: TaskCreate):
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO tasks (title, description, completed) VALUES (?, ?, ?)",
-        (task.title, task.description, task.completed)
-    )
-    conn.commit()
-    task_id = cursor.lastrowid
-    conn.close()
+@app.post("/items", status_code=201, response_model=None)
+async def create_task(task: TaskCreate):
+    async with app.state.pool.acquire_write() as conn:
+        row = await fetch_one(
+            conn,
+            SQL_INSERT_TASK,
+            (task.title, task.description, task.completed)
+        )
+    task_id = row["id"]
     
-    return {
+    return ORJSONResponse({
         "id": task_id,
         "title": task.title,
         "description": task.description,
         "completed": task.completed
-    }
+    }, status_code=201)
 
 # GET /items - Получить все задачи
-@app.get("/items")
-def get_all_tasks():
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM tasks")
-    tasks = cursor.fetchall()
-    conn.close()
+@app.get("/items", response_model=None)
+async def get_all_tasks():
+    # Строки читаем кортежами и собираем словари через zip (без поколоночного доступа sqlite3.Row)
+    async with app.state.pool.acquire_read(row_factory=None) as conn:
+        tasks = await conn.execute_fetchall(SQL_SELECT_ALL_TASKS)
     
-    return [dict(task) for task in tasks]
+    # Возвращаем ORJSONResponse напрямую, минуя jsonable_encoder
+    return ORJSONResponse([dict(zip(TASK_COLUMNS, task)) for task in tasks])
 
 # GET /items/{item_id} - Получить задачу по ID
-@app.get("/items/{item_id}")
-def get_task(item_id: int):
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM tasks WHERE id = ?", (item_id,))
-    task = cursor.fetchone()
-    conn.close()
+@app.get("/items/{item_id}", response_model=None)
+async def get_task(item_id: int):
+    async with app.state.pool.acquire_read() as conn:
+        task = await fetch_one(conn, SQL_SELECT_TASK, (item_id,))
     
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    return dict(task)
+    return ORJSONResponse(dict(task))
 
 # PUT /items/{item_id} - Обновить задачу
-@app.put("/items/{item_id}")
-def update_task(item_id: int, task: TaskUpdate):
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT * FROM tasks WHERE id = ?", (item_id,))
-    existing_task = cursor.fetchone()
-    
-    if not existing_task:
-        conn.close()
-        raise HTTPException(status_code=404, detail="Task not found")
-    
-    update_fields = []
+@app.put("/items/{item_id}", response_model=None)
+async def update_task(item_id: int, task: TaskUpdate):
+    values = (task.title, task.description, task.completed)
+    mask = 0
     update_values = []
+    for i, value in enumerate(values):
+        if value is not None:
+            mask |= 1 << i
+            update_values.append(value)
+    update_values.append(item_id)
     
-    if task.title is not None:
-        update_fields.append("title = ?")
-        update_values.append(task.title)
-    
-    if task.description is not None:
-        update_fields.append("description = ?")
-        update_values.append(task.description)
+    # Один запрос: UPDATE ... RETURNING, пустой результат означает 404
+    async with app.state.pool.acquire_write() as conn:
+        updated_task = await fetch_one(conn, SQL_UPDATE_TASK[mask], update_values)
     
-    if task.completed is not None:
-        update_fields.append("completed = ?")
-        update_values.append(task.completed)
-    
-    if update_fields:
-        update_values.append(item_id)
-        query = f"UPDATE tasks SET {', '.join(update_fields)} WHERE id = ?"
-        cursor.execute(query, update_values)
-        conn.commit()
-    
-    cursor.execute("SELECT * FROM tasks WHERE id = ?", (item_id,))
-    updated_task = cursor.fetchone()
-    conn.close()
+    if not updated_task:
+        raise HTTPException(status_code=404, detail="Task not found")
     
-    return dict(updated_task)
+    return ORJSONResponse(dict(updated_task))
 
 # DELETE /items/{item_id} - Удалить задачу
 @app.delete("/items/{item_id}")
-def delete_task(item_id: int):
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT * FROM tasks WHERE id = ?", (item_id,))
-    task = cursor.fetchone()
+async def delete_task(item_id: int):
+    async with app.state.pool.acquire_write() as conn:
+        deleted = await fetch_one(conn, SQL_DELETE_TASK, (item_id,))
     
-    if not task:
-        conn.close()
+    if not deleted:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    cursor.execute("DELETE FROM tasks WHERE id = ?", (item_id,))
-    conn.commit()
-    conn.close()
-    
     return {"message": "Task deleted successfully"}
 
+# GET /pool-health - Состояние пула соединений
+@app.get("/pool-health")
+async def pool_health():
+    return app.state.pool.health()
+
 # Корневой эндпоинт
 @app.get("/")
-def root():
+async def root():
     return {"message": "ToDo Service is running!"}
\ No newline at end of file